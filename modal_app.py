@@ -48,8 +48,16 @@ Authentication:
     - MCP Inspector: Use auth=oauth option
 """
 
-import modal
+import asyncio
+import contextlib
+import logging
+import os
+import sys
+import time
 from pathlib import Path
+from typing import Any
+
+import modal
 
 # Define the Modal app
 app = modal.App("portfolio-mcp")
@@ -79,6 +87,85 @@ image = (
 # Langfuse secret for observability
 langfuse_secret = modal.Secret.from_name("langfuse")
 
+# Allowed emails (comma-separated), built once when the container imports
+# this module. Empty outside the container, where the secret isn't mounted.
+ALLOWED_EMAILS = frozenset(
+    email.strip().lower()
+    for email in os.environ.get("ALLOWED_EMAILS", "").split(",")
+    if email.strip()
+)
+
+# ASGI app built by web(), reused if Modal calls the factory again
+_http_app = None
+
+# The source is copied to /root/src in the image. Importing at module scope
+# loads fastmcp/pandas/polygon while the container starts rather than inside
+# the web() factory; image.imports() skips these when deploying locally.
+sys.path.insert(0, "/root/src")
+
+with image.imports():
+    from fastmcp.server.auth.providers.google import GoogleProvider
+
+    from portfolio_mcp import tools
+    from portfolio_mcp.observability import (
+        AuthAndTracingMiddleware,
+        flush_traces,
+        init_langfuse,
+    )
+
+    # Import the MCP server with all tools already registered
+    from portfolio_mcp.server import mcp
+
+
+class ModalDictStore:
+    """Async key-value store using Modal Dict.
+
+    Implements the interface expected by FastMCP's client_storage parameter.
+    Modal Dict provides persistent, shared storage across all function instances.
+    Dict access is a blocking RPC, so it runs in a worker thread to keep
+    the event loop free. Reads are served from a short-lived in-process
+    cache; writes go through to Modal Dict and update the cache.
+    """
+
+    __slots__ = ("_cache", "_ttl")
+
+    def __init__(self, ttl: float = 60.0):
+        # key -> (expires_at, value), using time.monotonic()
+        self._cache: dict[str, tuple[float, Any]] = {}
+        self._ttl = ttl
+
+    async def get(self, key: str, **kwargs) -> Any:
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return cached[1]
+        try:
+            value = await asyncio.to_thread(oauth_dict.__getitem__, key)
+        except KeyError:
+            self._cache.pop(key, None)
+            return None
+        self._cache[key] = (time.monotonic() + self._ttl, value)
+        return value
+
+    async def put(self, key: str, value: Any, **kwargs) -> None:
+        await asyncio.to_thread(oauth_dict.__setitem__, key, value)
+        self._cache[key] = (time.monotonic() + self._ttl, value)
+
+    async def delete(self, key: str, **kwargs) -> None:
+        self._cache.pop(key, None)
+        try:
+            await asyncio.to_thread(oauth_dict.__delitem__, key)
+        except KeyError:
+            pass
+
+    async def exists(self, key: str, **kwargs) -> bool:
+        cached = self._cache.get(key)
+        if cached is not None and time.monotonic() < cached[0]:
+            return True
+        return await asyncio.to_thread(oauth_dict.__contains__, key)
+
+    async def keys(self, **kwargs) -> list:
+        return await asyncio.to_thread(lambda: list(oauth_dict.keys()))
+
 
 @app.function(
     image=image,
@@ -99,64 +186,19 @@ def web():
     
     Tools are imported from server.py (single source of truth).
     Auth and tracing are added via middleware.
+    The app is built once per container and reused on later calls.
     """
-    import os
-    import sys
+    global _http_app
+    if _http_app is not None:
+        return _http_app
 
-    # Add source path for imports
-    sys.path.insert(0, "/root/src")
-
-    from typing import Any
-
-    from fastmcp.server.auth.providers.google import GoogleProvider
-
-    # Import the MCP server with all tools already registered
-    from portfolio_mcp.server import mcp
-
-    # Import observability utilities
-    from portfolio_mcp.observability import (
-        init_langfuse,
-        AuthAndTracingMiddleware,
-    )
+    # Surface the tracing status logs in the Modal container logs
+    logging.getLogger("portfolio_mcp").setLevel(logging.INFO)
+    logging.basicConfig()
 
     # Initialize Langfuse tracing (no-op if credentials not set)
     init_langfuse()
 
-    # Load allowed emails from environment (comma-separated)
-    ALLOWED_EMAILS = set(
-        email.strip().lower()
-        for email in os.environ.get("ALLOWED_EMAILS", "").split(",")
-        if email.strip()
-    )
-
-    class ModalDictStore:
-        """Async key-value store using Modal Dict.
-
-        Implements the interface expected by FastMCP's client_storage parameter.
-        Modal Dict provides persistent, shared storage across all function instances.
-        """
-
-        async def get(self, key: str, **kwargs) -> Any:
-            try:
-                return oauth_dict[key]
-            except KeyError:
-                return None
-
-        async def put(self, key: str, value: Any, **kwargs) -> None:
-            oauth_dict[key] = value
-
-        async def delete(self, key: str, **kwargs) -> None:
-            try:
-                del oauth_dict[key]
-            except KeyError:
-                pass
-
-        async def exists(self, key: str, **kwargs) -> bool:
-            return key in oauth_dict
-
-        async def keys(self, **kwargs) -> list:
-            return list(oauth_dict.keys())
-
     # Configure Google OAuth
     # Note: FastMCP 2.14.x doesn't support jwt_signing_key (added in 3.x)
     # It will derive a signing key from the client_secret automatically
@@ -192,11 +234,26 @@ def web():
     # )
 
     # Create the HTTP app
-    return mcp.http_app(
+    http_app = mcp.http_app(
         transport="streamable-http",
         stateless_http=True,
     )
 
+    # Traces are flushed in batches during requests, so drain whatever is
+    # still pending when the container shuts down
+    mcp_lifespan = http_app.router.lifespan_context
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        async with mcp_lifespan(app):
+            yield
+        await asyncio.to_thread(flush_traces)
+
+    http_app.router.lifespan_context = lifespan
+
+    _http_app = http_app
+    return _http_app
+
 
 # Optional: Test function to verify deployment (without OAuth)
 @app.function(
@@ -214,12 +271,6 @@ async def test_tools():
     OAuth-protected HTTP endpoint. For full OAuth testing, use
     Claude Desktop or the MCP inspector with auth=oauth.
     """
-    import sys
-
-    sys.path.insert(0, "/root/src")
-
-    from portfolio_mcp import tools
-
     print("Testing tools directly...")
 
     # Test get_market_time
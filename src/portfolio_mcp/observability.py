@@ -4,164 +4,423 @@ Uses Langfuse SDK v3 API (get_client, start_as_current_span).
 Tracing failures are silently ignored to prevent breaking the MCP server.
 
 Usage:
-    from portfolio_mcp.observability import init_langfuse, trace_tool, flush_traces
+    from portfolio_mcp.observability import (
+        init_langfuse, trace_tool, maybe_flush, flush_traces,
+    )
 
     # At startup
     init_langfuse()
 
-    # Wrap tool calls
+    # Wrap tool calls (the function and its arguments are passed through)
     result = trace_tool("get_stock_quote", {"symbol": "AAPL"}, user_email)(
-        lambda: tools.get_stock_quote("AAPL")
+        tools.get_stock_quote, "AAPL"
     )
 
-    # At end of request
+    # At end of request (flushes only when LANGFUSE_FLUSH_MODE=sync)
+    maybe_flush()
+
+    # At shutdown
     flush_traces()
 """
 
+import atexit
+import contextlib
+import functools
+import hashlib
+import json
+import logging
 import os
+import random
+import reprlib
+import sys
+import threading
 import time
-from typing import Any, Callable
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Callable, Iterable, Iterator
+
+try:
+    from fastmcp.server.dependencies import get_access_token
+except ImportError:
+    # FastMCP dependencies not available (e.g., local stdio mode)
+    get_access_token = None
+
+try:
+    from langfuse import get_client
+except ImportError:
+    # Langfuse not installed; tracing stays disabled
+    get_client = None
+
+# Logs go to stderr via logging, never stdout: in stdio mode stdout carries
+# the MCP JSON-RPC stream.
+log = logging.getLogger(__name__)
 
 # Global state
 _langfuse = None
 _enabled = False
+# Bound Langfuse span factories, resolved once in init_langfuse():
+# _start_span sets the span as the global current context (sync tools);
+# _start_detached_span does not, so concurrent async calls don't contend on
+# the shared context (spans opened inside them are not nested under them).
+_start_span = None
+_start_detached_span = None
+
+# How traces are flushed (LANGFUSE_FLUSH_MODE):
+#   background - a daemon thread flushes every _FLUSH_INTERVAL_S, or sooner
+#                once _FLUSH_MAX_PENDING spans are queued (default)
+#   sync       - flush after every tool call (adds latency; for debugging)
+#   off        - only flush at shutdown
+_FLUSH_MODES = ("background", "sync", "off")
+_flush_mode = "background"
+_FLUSH_MAX_PENDING = 16
+_FLUSH_INTERVAL_S = 1.0
+_pending = 0
+_flush_lock = threading.Lock()
+_flush_wakeup = threading.Event()
+
+# Fraction of successful tool calls traced (LANGFUSE_SAMPLE_RATE, 0.0-1.0).
+# Failed calls are always traced.
+_sample_rate = 1.0
+
+# Whether tool outputs are uploaded with spans (LANGFUSE_CAPTURE_OUTPUT);
+# when off, spans carry only inputs, duration and success
+_capture_output = True
+
+# Metadata attached to every tool span
+_BASE_METADATA = {"mcp_server": "portfolio-mcp"}
+
+# Tool outputs larger than this are summarized instead of uploaded
+_MAX_OUTPUT_BYTES = 16 * 1024
+
+# Middleware span outputs are cut to this many characters
+_MAX_OUTPUT_CHARS = 1000
+_output_repr = reprlib.Repr()
+_output_repr.maxstring = 200
+_output_repr.maxlist = 10
+_output_repr.maxdict = 10
+_output_repr.maxother = _MAX_OUTPUT_CHARS
+
+# Per-token authorization decisions kept by the middleware: max entries, and
+# max seconds a decision is reused (never past the token's own expiry)
+_AUTHZ_CACHE_MAXSIZE = 1024
+_AUTHZ_CACHE_TTL_S = 30.0
 
 
 def init_langfuse() -> bool:
     """Initialize Langfuse tracing for MCP tool calls.
 
-    Uses Langfuse SDK v3 API with get_client().
-    Returns True if enabled, False otherwise.
+    Only checks credentials here (the SDK is imported with the module). The
+    auth check runs on a background thread so it stays off the cold-start
+    path; tool calls run untraced until the client is ready.
+    Returns True if initialization was started, False otherwise.
     """
-    global _langfuse, _enabled
+    global _flush_mode, _sample_rate, _capture_output
 
     secret = os.environ.get("LANGFUSE_SECRET_KEY", "")
     public = os.environ.get("LANGFUSE_PUBLIC_KEY", "")
 
     if not secret or not public:
-        print("Langfuse: disabled (no credentials)")
+        log.info("Langfuse: disabled (no credentials)")
         return False
 
+    if get_client is None:
+        log.warning("Langfuse: package not installed - disabled")
+        return False
+
+    mode = os.environ.get("LANGFUSE_FLUSH_MODE", "background").lower()
+    if mode not in _FLUSH_MODES:
+        log.warning("Langfuse: unknown LANGFUSE_FLUSH_MODE '%s', using background", mode)
+        mode = "background"
+    _flush_mode = mode
+
     try:
-        from langfuse import get_client
+        rate = float(os.environ.get("LANGFUSE_SAMPLE_RATE", "1.0"))
+    except ValueError:
+        log.warning("Langfuse: invalid LANGFUSE_SAMPLE_RATE, tracing every call")
+        rate = 1.0
+    _sample_rate = min(max(rate, 0.0), 1.0)
+
+    capture = os.environ.get("LANGFUSE_CAPTURE_OUTPUT", "true").lower()
+    _capture_output = capture not in ("0", "false", "no", "off")
+
+    threading.Thread(target=_connect_langfuse, name="langfuse-init", daemon=True).start()
+    return True
+
+
+def _connect_langfuse() -> None:
+    """Create and verify the Langfuse client, then enable tracing.
+
+    Uses Langfuse SDK v3 API with get_client().
+    """
+    global _langfuse, _enabled, _start_span, _start_detached_span
 
+    try:
         # get_client() returns a singleton Langfuse instance
-        _langfuse = get_client()
+        client = get_client()
 
         # Verify auth works
-        if not _langfuse.auth_check():
-            print("Langfuse: auth failed - disabled")
-            _langfuse = None
-            return False
-
+        if not client.auth_check():
+            log.warning("Langfuse: auth failed - disabled")
+            return
+
+        # Resolve the span API once instead of on every traced call
+        start_span = getattr(client, "start_as_current_span", None)
+        if start_span is None:
+            log.warning("Langfuse: SDK v3 span API not available - disabled")
+            return
+
+        _langfuse = client
+        _start_span = start_span
+        _start_detached_span = getattr(client, "start_span", None)
         _enabled = True
         host = os.environ.get("LANGFUSE_HOST", "https://cloud.langfuse.com")
-        print(f"Langfuse: enabled ({host})")
-        return True
+        log.info("Langfuse: enabled (%s, flush=%s)", host, _flush_mode)
+
+        # Drain on interpreter exit; the ASGI lifespan also drains on shutdown
+        atexit.register(flush_traces)
+        if _flush_mode == "background":
+            threading.Thread(target=_flush_loop, name="langfuse-flush", daemon=True).start()
 
     except Exception as e:
-        print(f"Langfuse: init failed ({e}) - disabled")
-        _langfuse = None
-        _enabled = False
-        return False
+        log.warning("Langfuse: init failed (%s) - disabled", e)
 
 
 def trace_tool(
     tool_name: str,
     inputs: dict[str, Any],
     user_id: str | None = None,
-) -> Callable[[Callable[[], Any]], Any]:
+) -> Callable[..., Any]:
     """Trace a tool call with Langfuse.
 
-    Uses Langfuse SDK v3 context manager API.
-    Failures are silently ignored to prevent breaking tools.
+    Returns execute(func, *args, **kwargs), which calls func with the given
+    arguments inside a span. Uses Langfuse SDK v3 context manager API.
+    Tracing failures are silently ignored to prevent breaking tools; the
+    tool's own exceptions propagate unchanged, and the tool never runs twice.
     """
 
-    def execute(func: Callable[[], Any]) -> Any:
-        if not _enabled or _langfuse is None:
-            return func()
+    def execute(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        if not _enabled:
+            return func(*args, **kwargs)
 
+        call = None
+        done = False
+        result = None
         try:
-            return _traced_execute(func, tool_name, inputs, user_id)
+            with _tool_span(tool_name, inputs, user_id) as call:
+                result = func(*args, **kwargs)
+                done = True
+                if _capture_output and call.sampled:
+                    call.output = _bounded_output(result)
+            return result
         except Exception as e:
-            print(f"Langfuse: trace error ignored ({e})")
-            return func()
+            if call is not None and not done:
+                # The tool itself failed; the span has recorded it
+                raise
+            # The span failed to open (the tool hasn't run) or to close
+            # (it already has): run untraced or keep its result
+            log.warning("Langfuse: trace error ignored (%s)", e)
+            return result if done else func(*args, **kwargs)
 
     return execute
 
 
-def _traced_execute(
-    func: Callable[[], Any],
+@functools.lru_cache(maxsize=32)
+def _span_name(tool_name: str) -> str:
+    """Span name for a tool, built once per tool."""
+    return sys.intern(f"mcp-tool-{tool_name}")
+
+
+@contextlib.contextmanager
+def _detached_span(name: str, inputs: dict[str, Any]) -> Iterator[Any]:
+    """Open a span without making it Langfuse's current span.
+
+    The span is ended explicitly on exit. Because it is never the current
+    span, any span or generation created while the tool runs becomes its own
+    trace rather than a child of this one; the tools create none today.
+    """
+    span = _start_detached_span(name=name, input=inputs)
+    try:
+        yield span
+    finally:
+        span.end()
+
+
+@contextlib.contextmanager
+def _tool_span(
     tool_name: str,
     inputs: dict[str, Any],
     user_id: str | None,
-) -> Any:
-    """Execute function with Langfuse tracing using SDK v3 API."""
-
-    # Use the context manager API from SDK v3
-    # start_as_current_span creates a span and sets it as the current context
-    with _langfuse.start_as_current_span(
-        name=f"mcp-tool-{tool_name}",
-        input=inputs,
-    ) as span:
-        # Update trace-level attributes if we have user_id
-        if user_id:
-            span.update_trace(user_id=user_id)
-
-        # Add metadata
+    detached: bool = False,
+) -> Iterator[SimpleNamespace]:
+    """Trace one tool call in a Langfuse span.
+
+    Shared by the sync and async paths. Yields a call record whose
+    ``output`` the caller sets (only when ``sampled`` is true, so calls left
+    out don't pay for serializing it); on exit the span gets the output (or
+    the error), the duration, and the success flag. The async middleware passes
+    detached=True so the span is not made Langfuse's global current span
+    (nested spans then don't attach to it; see _detached_span).
+
+    Calls left out by LANGFUSE_SAMPLE_RATE run without a span, unless they
+    fail: errors are always reported.
+    """
+    sampled = _sample_rate >= 1.0 or random.random() < _sample_rate
+    call = SimpleNamespace(output=None, sampled=sampled)
+
+    if not sampled:
+        start_ns = time.perf_counter_ns()
+        try:
+            yield call
+        except Exception as e:
+            with _open_span(tool_name, inputs, user_id, detached) as span:
+                _update_failed(span, tool_name, e, start_ns)
+            raise
+        return
+
+    with _open_span(tool_name, inputs, user_id, detached) as span:
+        start_ns = time.perf_counter_ns()
+
+        try:
+            yield call
+        except Exception as e:
+            _update_failed(span, tool_name, e, start_ns)
+            raise
+
         span.update(
+            output=call.output,
             metadata={
                 "tool": tool_name,
-                "mcp_server": "portfolio-mcp",
-            }
+                **_BASE_METADATA,
+                "duration_ms": (time.perf_counter_ns() - start_ns) / 1_000_000,
+                "success": True,
+            },
         )
 
-        start_time = time.time()
-        error = None
-        result = None
 
+@contextlib.contextmanager
+def _open_span(
+    tool_name: str,
+    inputs: dict[str, Any],
+    user_id: str | None,
+    detached: bool,
+) -> Iterator[Any]:
+    """Open a tool span tagged with the user.
+
+    The tool/server metadata is sent with the span's single exit update.
+    """
+    name = _span_name(tool_name)
+    if detached and _start_detached_span is not None:
+        span_cm = _detached_span(name, inputs)
+    else:
+        # start_as_current_span creates a span and sets it as the current context
+        span_cm = _start_span(name=name, input=inputs)
+
+    try:
+        with span_cm as span:
+            # Update trace-level attributes if we have user_id
+            if user_id:
+                span.update_trace(user_id=user_id)
+
+            yield span
+    finally:
+        # Count the span only once it has ended, so a flush that runs while
+        # it is open can't clear it from the pending count
+        _record_span()
+
+
+def _update_failed(span: Any, tool_name: str, error: Exception, start_ns: int) -> None:
+    """Record a failed tool call on its span."""
+    span.update(
+        output={"error": str(error)},
+        level="ERROR",
+        status_message=str(error),
+        metadata={
+            "tool": tool_name,
+            **_BASE_METADATA,
+            "duration_ms": (time.perf_counter_ns() - start_ns) / 1_000_000,
+            "success": False,
+        },
+    )
+
+
+def _bounded_output(result: Any) -> Any:
+    """Summarize tool outputs too large to upload with the span."""
+    if isinstance(result, str):
+        size = len(result)
+    else:
         try:
-            result = func()
+            size = len(json.dumps(result, default=str))
+        except (TypeError, ValueError):
             return result
-        except Exception as e:
-            error = e
-            raise
-        finally:
-            duration_ms = (time.time() - start_time) * 1000
-
-            # Update span with result or error
-            if error:
-                span.update(
-                    output={"error": str(error)},
-                    level="ERROR",
-                    status_message=str(error),
-                    metadata={
-                        "tool": tool_name,
-                        "duration_ms": round(duration_ms, 2),
-                        "success": False,
-                    },
-                )
-            else:
-                span.update(
-                    output=result,
-                    metadata={
-                        "tool": tool_name,
-                        "duration_ms": round(duration_ms, 2),
-                        "success": True,
-                    },
-                )
+
+    if size <= _MAX_OUTPUT_BYTES:
+        return result
+
+    return {
+        "_truncated": True,
+        "size_bytes": size,
+        "keys": list(result.keys()) if isinstance(result, dict) else None,
+    }
+
+
+def _truncate_repr(obj: Any, limit: int = _MAX_OUTPUT_CHARS) -> str:
+    """Short repr of a tool result without building the full string first."""
+    if isinstance(obj, str):
+        return obj[:limit]
+    # FastMCP ToolResult: the tools return JSON text, so slice it directly
+    content = getattr(obj, "content", None)
+    if isinstance(content, list) and content:
+        text = getattr(content[0], "text", None)
+        if isinstance(text, str):
+            return text[:limit]
+    return _output_repr.repr(obj)[:limit]
+
+
+def _record_span() -> None:
+    """Count a span as pending and wake the flusher once enough have queued."""
+    global _pending
+    with _flush_lock:
+        _pending += 1
+        if _pending >= _FLUSH_MAX_PENDING:
+            _flush_wakeup.set()
+
+
+def _flush_loop() -> None:
+    """Flush traces in the background for LANGFUSE_FLUSH_MODE=background."""
+    while True:
+        _flush_wakeup.wait(_FLUSH_INTERVAL_S)
+        _flush_wakeup.clear()
+        flush_traces()
+
+
+def maybe_flush() -> None:
+    """Flush after a tool call if LANGFUSE_FLUSH_MODE is "sync".
+
+    In the default background mode a daemon thread flushes periodically, so
+    the tool response never waits on the Langfuse HTTP round-trip.
+    """
+    if _flush_mode == "sync":
+        flush_traces()
 
 
 def flush_traces() -> None:
     """Flush all pending traces to Langfuse.
 
-    Important for serverless environments!
+    Important for serverless environments! Blocks until sent, so call it
+    at shutdown to drain. Skipped when no spans were recorded since the
+    last flush, since the SDK would otherwise still make a request.
     """
-    if _langfuse is not None:
-        try:
-            _langfuse.flush()
-        except Exception:
-            pass
+    global _pending
+    if _langfuse is None:
+        return
+    with _flush_lock:
+        if _pending == 0:
+            return
+        _pending = 0
+    try:
+        _langfuse.flush()
+    except Exception:
+        pass
 
 
 def is_enabled() -> bool:
@@ -174,13 +433,24 @@ def is_enabled() -> bool:
 # =============================================================================
 
 
+def _token_cache_key(token) -> str:
+    """Build a cache key for an access token.
+
+    Prefers the JWT ID claim; falls back to a digest of the raw token.
+    """
+    jti = token.claims.get("jti")
+    if jti:
+        return str(jti)
+    return hashlib.blake2b(token.token.encode(), digest_size=16).hexdigest()
+
+
 class AuthAndTracingMiddleware:
     """FastMCP middleware that adds OAuth authorization and Langfuse tracing.
 
     This middleware intercepts all tool calls and:
     1. Checks that the user's email is in the allowed list
     2. Traces the call with Langfuse (if enabled)
-    3. Flushes traces after each call (important for serverless)
+    3. Leaves flushing to the background flusher (see LANGFUSE_FLUSH_MODE)
 
     Usage:
         from portfolio_mcp.observability import AuthAndTracingMiddleware
@@ -193,57 +463,113 @@ class AuthAndTracingMiddleware:
 
     def __init__(
         self,
-        allowed_emails: set[str] | None = None,
+        allowed_emails: Iterable[str] | None = None,
         require_auth: bool = True,
     ):
         """Initialize the middleware.
 
         Args:
-            allowed_emails: Set of allowed email addresses (lowercase).
-                           If None, all authenticated users are allowed.
+            allowed_emails: Allowed email addresses (any iterable, e.g. the
+                           ALLOWED_EMAILS frozenset); matched
+                           case-insensitively. If None or empty, all
+                           authenticated users are allowed.
             require_auth: If True, require authentication. If False, allow
                          unauthenticated requests (useful for local dev).
         """
-        self.allowed_emails = allowed_emails or set()
+        self.allowed_emails = frozenset(
+            e.strip().lower() for e in (allowed_emails or ()) if e.strip()
+        )
+        self._has_allowlist = bool(self.allowed_emails)
         self.require_auth = require_auth
+        # token key -> (user_email, denial_message, expires_at), LRU ordered
+        self._authz_cache: OrderedDict[str, tuple] = OrderedDict()
+        self._authz_lock = threading.Lock()
 
     def _get_user_email(self) -> str | None:
         """Get the authenticated user's email from the access token.
 
+        Decisions (including denials) are cached per token for up to 30s
+        (never past the token's expiry), so repeated tool calls with the
+        same token skip the claims check.
+
         Returns the email if authenticated, None otherwise.
         Raises PermissionError if auth is required but not present.
         """
-        try:
-            from fastmcp.server.dependencies import get_access_token
+        if get_access_token is None:
+            if self.require_auth:
+                raise PermissionError("Auth dependencies not available")
+            return None
+
+        token = get_access_token()
 
-            token = get_access_token()
+        if not token or not token.claims:
+            if self.require_auth:
+                raise PermissionError("No authentication token found")
+            return None
 
-            if not token or not token.claims:
-                if self.require_auth:
-                    raise PermissionError("No authentication token found")
-                return None
+        key = _token_cache_key(token)
+        with self._authz_lock:
+            cached = self._authz_cache.get(key)
+            if cached is not None:
+                if time.time() < cached[2]:
+                    self._authz_cache.move_to_end(key)
+                else:
+                    del self._authz_cache[key]
+                    cached = None
 
-            user_email = token.claims.get("email", "").lower()
+        if cached is not None:
+            user_email, denial, _ = cached
+            if denial:
+                raise PermissionError(denial)
+            return user_email
 
-            if not user_email:
-                if self.require_auth:
-                    raise PermissionError("No email found in token")
-                return None
+        expires_at = token.expires_at or token.claims.get("exp")
+        try:
+            user_email = self._check_claims(token.claims)
+        except PermissionError as e:
+            self._remember(key, None, str(e), expires_at)
+            raise
+        self._remember(key, user_email, None, expires_at)
+        return user_email
 
-            # Check allowlist if configured
-            if self.allowed_emails and user_email not in self.allowed_emails:
-                raise PermissionError(
-                    f"Access denied. Email '{user_email}' is not authorized."
-                )
+    def _check_claims(self, claims: dict[str, Any]) -> str | None:
+        """Validate token claims against the allowlist.
 
-            return user_email
+        Returns the lowercased email, or None if unauthenticated access is allowed.
+        Raises PermissionError if the email is missing or not allowed.
+        """
+        user_email = claims.get("email", "").lower()
 
-        except ImportError:
-            # FastMCP dependencies not available (e.g., local stdio mode)
+        if not user_email:
             if self.require_auth:
-                raise PermissionError("Auth dependencies not available")
+                raise PermissionError("No email found in token")
             return None
 
+        # Check allowlist if configured
+        if self._has_allowlist and user_email not in self.allowed_emails:
+            raise PermissionError(
+                f"Access denied. Email '{user_email}' is not authorized."
+            )
+
+        return user_email
+
+    def _remember(
+        self,
+        key: str,
+        user_email: str | None,
+        denial: str | None,
+        expires_at: float | None,
+    ) -> None:
+        """Cache an authorization decision for the TTL or until the token expires."""
+        cache_until = time.time() + _AUTHZ_CACHE_TTL_S
+        if expires_at:
+            cache_until = min(cache_until, float(expires_at))
+        with self._authz_lock:
+            self._authz_cache[key] = (user_email, denial, cache_until)
+            self._authz_cache.move_to_end(key)
+            while len(self._authz_cache) > _AUTHZ_CACHE_MAXSIZE:
+                self._authz_cache.popitem(last=False)
+
     async def on_call_tool(self, context, call_next):
         """Intercept tool calls to add auth check and tracing.
 
@@ -251,22 +577,22 @@ class AuthAndTracingMiddleware:
             context: MiddlewareContext with message.name and message.arguments
             call_next: Function to call the next middleware/handler
         """
-        tool_name = context.message.name
-        arguments = dict(context.message.arguments) if context.message.arguments else {}
-
         # Check authorization
         user_email = self._get_user_email()
 
-        # Execute with tracing
-        if _enabled and _langfuse is not None:
+        # Execute with tracing. The arguments are passed to Langfuse as-is:
+        # its serializer doesn't mutate them, so no defensive copy is needed.
+        if _enabled:
+            message = context.message
             result = await self._traced_call(
-                call_next, context, tool_name, arguments, user_email
+                call_next, context, message.name, message.arguments or {}, user_email
             )
         else:
             result = await call_next(context)
 
-        # Flush traces (important for serverless)
-        flush_traces()
+        # Only flushes here in sync mode; otherwise the background flusher
+        # and the shutdown drain send the traces
+        maybe_flush()
 
         return result
 
@@ -279,53 +605,8 @@ class AuthAndTracingMiddleware:
         user_email: str | None,
     ):
         """Execute tool call with Langfuse tracing."""
-        import time
-
-        with _langfuse.start_as_current_span(
-            name=f"mcp-tool-{tool_name}",
-            input=arguments,
-        ) as span:
-            if user_email:
-                span.update_trace(user_id=user_email)
-
-            span.update(
-                metadata={
-                    "tool": tool_name,
-                    "mcp_server": "portfolio-mcp",
-                }
-            )
-
-            start_time = time.time()
-            error = None
-            result = None
-
-            try:
-                result = await call_next(context)
-                return result
-            except Exception as e:
-                error = e
-                raise
-            finally:
-                duration_ms = (time.time() - start_time) * 1000
-
-                if error:
-                    span.update(
-                        output={"error": str(error)},
-                        level="ERROR",
-                        status_message=str(error),
-                        metadata={
-                            "tool": tool_name,
-                            "duration_ms": round(duration_ms, 2),
-                            "success": False,
-                        },
-                    )
-                else:
-                    # For async results, we may need to handle differently
-                    span.update(
-                        output=str(result)[:1000] if result else None,
-                        metadata={
-                            "tool": tool_name,
-                            "duration_ms": round(duration_ms, 2),
-                            "success": True,
-                        },
-                    )
+        with _tool_span(tool_name, arguments, user_email, detached=True) as call:
+            result = await call_next(context)
+            if _capture_output and call.sampled and result:
+                call.output = _truncate_repr(result)
+            return result
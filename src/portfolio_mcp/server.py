@@ -6,23 +6,48 @@ Supports both stdio (local) and HTTP (cloud) transports.
 Upload your Schwab CSV through the UI, then use the analyze tool.
 """
 
+import asyncio
+import functools
 import json
 import os
 
 from fastmcp import FastMCP
 
-from .tools import (
-    analyze_portfolio,
-    analyze_position_cost_basis,
-    find_cash_secured_put,
-    find_covered_call,
-    generate_research_prompts,
-    get_market_time,
-    get_option_chain,
-    get_portfolio_context,
-    get_stock_quote,
-    update_portfolio_context,
-)
+
+def _lazy(name: str):
+    """Resolve a function from .tools on first call.
+
+    tools pulls in pandas and the Polygon client, so importing it lazily keeps
+    stdio startup fast. The resolved function is kept, so later calls go
+    straight to it, and its metadata (docstring, signature) is copied onto
+    the shim.
+    """
+    fn = None
+
+    def call(*args, **kwargs):
+        nonlocal fn
+        if fn is None:
+            from . import tools
+
+            fn = getattr(tools, name)
+            functools.update_wrapper(call, fn)
+        return fn(*args, **kwargs)
+
+    call.__name__ = call.__qualname__ = name
+    return call
+
+
+analyze_portfolio = _lazy("analyze_portfolio")
+analyze_position_cost_basis = _lazy("analyze_position_cost_basis")
+find_cash_secured_put = _lazy("find_cash_secured_put")
+find_covered_call = _lazy("find_covered_call")
+generate_research_prompts = _lazy("generate_research_prompts")
+get_market_time = _lazy("get_market_time")
+get_option_chain = _lazy("get_option_chain")
+get_portfolio_context = _lazy("get_portfolio_context")
+get_stock_quote = _lazy("get_stock_quote")
+update_portfolio_context = _lazy("update_portfolio_context")
+
 
 mcp = FastMCP(
     name="portfolio-mcp",
@@ -78,6 +103,10 @@ mcp = FastMCP(
     """
 )
 
+# Shared encoder for tool responses. Results are freshly built dicts, so the
+# circular-reference check is unnecessary.
+_encode = json.JSONEncoder(indent=2, ensure_ascii=False, check_circular=False).encode
+
 
 @mcp.tool(annotations={"title": "Get Market Time", "readOnlyHint": True})
 def mcp_get_market_time() -> str:
@@ -90,7 +119,7 @@ def mcp_get_market_time() -> str:
         session type, and weekday. All times in Eastern Time (ET).
     """
     result = get_market_time()
-    return json.dumps(result, indent=2)
+    return _encode(result)
 
 
 @mcp.tool(annotations={"title": "Analyze Portfolio", "readOnlyHint": True})
@@ -104,7 +133,7 @@ def mcp_analyze_portfolio(csv_content: str) -> str:
         JSON with alerts (prioritized risks), summary (cash, values), and holdings
     """
     result = analyze_portfolio(csv_content)
-    return json.dumps(result, indent=2)
+    return _encode(result)
 
 
 @mcp.tool(annotations={"title": "Generate Research Prompts", "readOnlyHint": True})
@@ -122,16 +151,20 @@ def mcp_generate_research_prompts(csv_content: str) -> str:
     """
     analysis = analyze_portfolio(csv_content)
     prompts = generate_research_prompts(analysis)
-    return json.dumps(prompts, indent=2)
+    return _encode(prompts)
 
 
 # =============================================================================
 # Market Data Tools
 # =============================================================================
 
+# The Polygon-backed tools are async and run the blocking HTTP calls in a
+# worker thread, so a slow chain fetch doesn't stall other requests on the
+# event loop.
+
 
 @mcp.tool(annotations={"title": "Get Stock Quote", "readOnlyHint": True})
-def mcp_get_stock_quote(symbol: str) -> str:
+async def mcp_get_stock_quote(symbol: str) -> str:
     """Get stock quote and key statistics (15-MINUTE DELAYED).
 
     ⚠️ Data is 15 minutes behind real-time. Use for analysis, not execution.
@@ -142,12 +175,12 @@ def mcp_get_stock_quote(symbol: str) -> str:
     Returns:
         JSON with price, change, volume, PE ratio, 52-week range, etc.
     """
-    result = get_stock_quote(symbol)
-    return json.dumps(result, indent=2)
+    result = await asyncio.to_thread(get_stock_quote, symbol)
+    return _encode(result)
 
 
 @mcp.tool(annotations={"title": "Get Option Chain", "readOnlyHint": True})
-def mcp_get_option_chain(
+async def mcp_get_option_chain(
     symbol: str,
     expiration: str = None,
     option_type: str = None,
@@ -173,7 +206,8 @@ def mcp_get_option_chain(
     Returns:
         JSON with stock price, expiration, and filtered option chains
     """
-    result = get_option_chain(
+    result = await asyncio.to_thread(
+        get_option_chain,
         symbol=symbol,
         expiration=expiration,
         option_type=option_type,
@@ -182,11 +216,11 @@ def mcp_get_option_chain(
         min_volume=min_volume,
         near_the_money=near_the_money,
     )
-    return json.dumps(result, indent=2)
+    return _encode(result)
 
 
 @mcp.tool(annotations={"title": "Find Covered Call", "readOnlyHint": True})
-def mcp_find_covered_call(
+async def mcp_find_covered_call(
     symbol: str,
     shares: int = 100,
     target_delta: float = 0.20,
@@ -209,7 +243,8 @@ def mcp_find_covered_call(
     Returns:
         JSON with stock info and top 10 call candidates ranked by delta proximity
     """
-    result = find_covered_call(
+    result = await asyncio.to_thread(
+        find_covered_call,
         symbol=symbol,
         shares=shares,
         target_delta=target_delta,
@@ -217,11 +252,11 @@ def mcp_find_covered_call(
         max_dte=max_dte,
         min_premium_pct=min_premium_pct,
     )
-    return json.dumps(result, indent=2)
+    return _encode(result)
 
 
 @mcp.tool(annotations={"title": "Find Cash-Secured Put", "readOnlyHint": True})
-def mcp_find_cash_secured_put(
+async def mcp_find_cash_secured_put(
     symbol: str,
     cash_available: float,
     target_delta: float = 0.20,
@@ -244,7 +279,8 @@ def mcp_find_cash_secured_put(
     Returns:
         JSON with stock info and top 10 put candidates ranked by delta proximity
     """
-    result = find_cash_secured_put(
+    result = await asyncio.to_thread(
+        find_cash_secured_put,
         symbol=symbol,
         cash_available=cash_available,
         target_delta=target_delta,
@@ -252,7 +288,7 @@ def mcp_find_cash_secured_put(
         max_dte=max_dte,
         min_premium_pct=min_premium_pct,
     )
-    return json.dumps(result, indent=2)
+    return _encode(result)
 
 
 # =============================================================================
@@ -261,7 +297,7 @@ def mcp_find_cash_secured_put(
 
 
 @mcp.tool(annotations={"title": "Analyze Position Cost Basis", "readOnlyHint": True})
-def mcp_analyze_position_cost_basis(csv_content: str, symbol: str) -> str:
+async def mcp_analyze_position_cost_basis(csv_content: str, symbol: str) -> str:
     """Calculate true premium-adjusted cost basis from Schwab transaction history.
 
     Parses a Schwab transaction CSV and computes:
@@ -279,8 +315,8 @@ def mcp_analyze_position_cost_basis(csv_content: str, symbol: str) -> str:
     Returns:
         JSON with acquisition, premium history, cost basis, current P&L, and ROAS
     """
-    result = analyze_position_cost_basis(csv_content, symbol)
-    return json.dumps(result, indent=2)
+    result = await asyncio.to_thread(analyze_position_cost_basis, csv_content, symbol)
+    return _encode(result)
 
 
 # =============================================================================
@@ -311,7 +347,7 @@ def mcp_get_portfolio_context(section: str = None) -> str:
         JSON with document content, metadata, and available sections
     """
     result = get_portfolio_context(section=section)
-    return json.dumps(result, indent=2)
+    return _encode(result)
 
 
 @mcp.tool(annotations={"title": "Update Portfolio Context"})
@@ -341,7 +377,7 @@ def mcp_update_portfolio_context(
         content=content,
         mode=mode,
     )
-    return json.dumps(result, indent=2)
+    return _encode(result)
 
 
 def run_server() -> None:
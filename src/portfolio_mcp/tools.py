@@ -7,16 +7,26 @@ Also includes market data tools using Polygon.io (Massive) API for fetching
 option chains and finding optimal covered call / cash-secured put candidates.
 """
 
+import functools
 import io
+import itertools
 import json
 import os
 import re
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from operator import itemgetter
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Optional
 
+import numpy as np
 import pandas as pd
 from polygon import RESTClient
+from urllib3.util.retry import Retry
+from urllib3.util.timeout import Timeout
 
 
 def _load_env_file():
@@ -42,18 +52,32 @@ def _load_env_file():
             break
 
 
+# Load .env at import, before the ttl_cache decorators below read their
+# *_TTL overrides and before the Polygon client reads its settings
+_load_env_file()
+
+
+# Concurrent Polygon requests per tool call, and kept-alive connections
+_POLYGON_MAX_CONNECTIONS = 10
+
+
+@functools.lru_cache(maxsize=1)
 def _get_polygon_client() -> RESTClient:
     """Get Polygon.io REST client using environment variable.
 
+    The client is built once per process and shared, so its HTTPS
+    connection pool stays warm across tool calls.
+
     Looks for POLYGON_API_KEY in:
     1. Environment variables (set in Claude Desktop config)
     2. .env file in portfolio-mcp directory
 
+    Requests time out after POLYGON_REQUEST_TIMEOUT seconds (default 10) and
+    rate-limit/server errors are retried up to POLYGON_MAX_RETRIES times
+    (default 5) with exponential backoff.
+
     Get your API key from https://polygon.io/dashboard/api-keys
     """
-    # Try loading from .env file first
-    _load_env_file()
-
     api_key = os.environ.get("POLYGON_API_KEY")
     if not api_key:
         raise ValueError(
@@ -62,7 +86,37 @@ def _get_polygon_client() -> RESTClient:
             "2. Add to Claude Desktop config env section\n"
             "Get your API key from https://polygon.io/dashboard/api-keys"
         )
-    return RESTClient(api_key)
+
+    # Per-request timeout and retry budget (POLYGON_REQUEST_TIMEOUT seconds,
+    # POLYGON_MAX_RETRIES attempts)
+    timeout = float(os.environ.get("POLYGON_REQUEST_TIMEOUT", "10"))
+    max_retries = int(os.environ.get("POLYGON_MAX_RETRIES", "5"))
+    client = RESTClient(
+        api_key,
+        connect_timeout=timeout,
+        read_timeout=timeout,
+        retries=max_retries,
+    )
+
+    # The client retries 429/5xx with a 0.1s backoff base, which burns through
+    # the retries before a rate limit clears. Back off 0.5s, 1s, 2s, 4s...
+    # with jitter instead; Retry-After headers are still honoured.
+    client.client.connection_pool_kw["retries"] = Retry(
+        total=max_retries,
+        status_forcelist=[413, 429, 499, 500, 502, 503, 504],
+        backoff_factor=0.5,
+        backoff_jitter=0.25,
+    )
+
+    # The client keeps connect/read_timeout on itself but never passes them to
+    # urllib3, so set them on the pool or a stalled socket hangs forever.
+    client.client.connection_pool_kw["timeout"] = Timeout(connect=timeout, read=timeout)
+
+    # urllib3 keeps one idle connection per host by default, so the parallel
+    # chain fetches would each reopen a TLS connection. Keep enough for all
+    # of them alive.
+    client.client.connection_pool_kw["maxsize"] = _POLYGON_MAX_CONNECTIONS
+    return client
 
 
 def get_market_time() -> dict:
@@ -161,16 +215,23 @@ def parse_option_symbol(sym: str) -> dict:
     }
 
 
-def parse_portfolio_from_csv(csv_content: str) -> tuple[pd.DataFrame, pd.DataFrame, float]:
+def _csv_buffer(csv_content: str | bytes) -> io.IOBase:
+    """Wrap CSV content for pandas, reading bytes without decoding to str first."""
+    if isinstance(csv_content, bytes):
+        return io.BytesIO(csv_content)
+    return io.StringIO(csv_content)
+
+
+def parse_portfolio_from_csv(csv_content: str | bytes) -> tuple[pd.DataFrame, pd.DataFrame, float]:
     """Parse portfolio CSV content and return equities, options, and cash.
 
     Args:
-        csv_content: Raw CSV content as string (from uploaded file)
+        csv_content: Raw CSV content as string or UTF-8 bytes (from uploaded file)
 
     Returns:
         Tuple of (equities_df, options_df, cash_balance)
     """
-    df = pd.read_csv(io.StringIO(csv_content), skiprows=1)
+    df = pd.read_csv(_csv_buffer(csv_content), skiprows=1)
 
     # Extract cash before filtering
     cash_row = df[df['Symbol'] == 'Cash & Cash Investments']
@@ -185,11 +246,12 @@ def parse_portfolio_from_csv(csv_content: str) -> tuple[pd.DataFrame, pd.DataFra
     return equities, options, cash
 
 
-def analyze_portfolio(csv_content: str) -> dict:
+def analyze_portfolio(csv_content: str | bytes) -> dict:
     """Main analysis function - takes CSV content, returns full analysis.
 
     Args:
-        csv_content: Raw CSV content as string (uploaded through Claude Desktop)
+        csv_content: Raw CSV content as string or UTF-8 bytes
+                     (uploaded through Claude Desktop)
 
     Returns:
         Dict with alerts, summary, and holdings
@@ -444,11 +506,14 @@ def safe_float(val, default: float = 0.0) -> float:
     """Safely convert a value to float, handling NaN and None."""
     if val is None:
         return default
+    # Fast path for the plain numbers Polygon returns (NaN != NaN)
+    if type(val) is float:
+        return val if val == val else default
+    if type(val) is int:
+        return float(val)
     try:
         result = float(val)
-        if pd.isna(result):
-            return default
-        return result
+        return result if result == result else default
     except (ValueError, TypeError):
         return default
 
@@ -457,24 +522,128 @@ def safe_int(val, default: int = 0) -> int:
     """Safely convert a value to int, handling NaN and None."""
     if val is None:
         return default
+    # Fast path for the plain numbers Polygon returns (NaN != NaN)
+    if type(val) is int:
+        return val
+    if type(val) is float:
+        return int(val) if val == val else default
     try:
         result = float(val)  # Convert via float first to handle "1.0" strings
-        if pd.isna(result):
-            return default
-        return int(result)
+        return int(result) if result == result else default
     except (ValueError, TypeError):
         return default
 
 
+def _round_or_none(val, ndigits: int) -> Optional[float]:
+    """Round a numeric field, keeping missing (None/NaN) values as None.
+
+    Unlike ``round(x) or None`` this keeps a genuine 0.0.
+    """
+    val = safe_float(val, None)
+    return None if val is None else round(val, ndigits)
+
+
+# In-process TTL cache for Polygon lookups:
+# (function name, args, kwargs) -> (expires_at, value), least recently used
+# first. Holds at most _CACHE_MAXSIZE entries. Clear with _CACHE.clear().
+_CACHE: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+_CACHE_MAXSIZE = 128
+_cache_lock = threading.Lock()
+
+
+def ttl_cache(seconds: float, env_var: Optional[str] = None) -> Callable:
+    """Cache a function's results per arguments for a fixed time.
+
+    Error results (empty values and dicts with an "error" key) are not
+    cached, so a failed lookup is retried on the next call. Cached values
+    are shared between callers and must not be mutated. Expired entries are
+    pruned on insert, and the least recently used entries are evicted once
+    the cache is full, so it stays bounded in long-running servers.
+
+    Args:
+        seconds: Time to live in seconds
+        env_var: Environment variable that overrides the TTL, if set
+    """
+    ttl = seconds
+    if env_var and os.environ.get(env_var):
+        try:
+            ttl = float(os.environ[env_var])
+        except ValueError:
+            pass
+
+    def decorator(fn):
+        name = fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with _cache_lock:
+                hit = _CACHE.get(key)
+                if hit is not None and now < hit[0]:
+                    _CACHE.move_to_end(key)
+                    return hit[1]
+
+            value = fn(*args, **kwargs)
+            if value and not (isinstance(value, dict) and "error" in value):
+                with _cache_lock:
+                    _CACHE[key] = (now + ttl, value)
+                    _CACHE.move_to_end(key)
+                    _prune_cache(now)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def _prune_cache(now: float) -> None:
+    """Drop expired entries, then the least recently used beyond _CACHE_MAXSIZE.
+
+    Caller must hold _cache_lock.
+    """
+    for key in [k for k, (expires_at, _) in _CACHE.items() if expires_at <= now]:
+        del _CACHE[key]
+    while len(_CACHE) > _CACHE_MAXSIZE:
+        _CACHE.popitem(last=False)
+
+
 def get_stock_quote(symbol: str) -> dict:
     """Get current stock quote and key statistics using Polygon.io.
 
+    Not cached itself: the snapshot and ticker details it combines are, and
+    each call returns a fresh dict the caller may modify.
+
     Args:
         symbol: Stock ticker symbol (e.g., 'NVDA', 'AAPL')
 
     Returns:
         Dict with price, change, volume, and key stats
     """
+    symbol = symbol.upper()
+
+    quote = _get_stock_snapshot(symbol)
+    if "error" in quote:
+        return quote
+
+    # Copy so the cached snapshot isn't modified
+    result = dict(quote)
+
+    # Try to get additional info from ticker details
+    details = _get_ticker_details(symbol)
+    if details:
+        result.update(details)
+
+    return result
+
+
+@ttl_cache(60, env_var="QUOTE_TTL")
+def _get_stock_snapshot(symbol: str) -> dict:
+    """Get price, change, and volume from the stock snapshot alone.
+
+    The option tools only need the price, so they use this rather than
+    get_stock_quote() and skip the ticker details request.
+    """
     client = _get_polygon_client()
     symbol = symbol.upper()
 
@@ -507,75 +676,96 @@ def get_stock_quote(symbol: str) -> dict:
             "change_pct": round(change_pct, 2),
             "prev_close": round(prev_close, 2) if prev_close else None,
             "volume": safe_int(day.volume if day else None),
-            "vwap": round(safe_float(day.vwap if day else None), 2) or None,
+            "vwap": _round_or_none(day.vwap if day else None, 2),
         }
 
-        # Try to get additional info from ticker details
-        try:
-            details = client.get_ticker_details(symbol)
-            if details:
-                result["market_cap"] = safe_int(details.market_cap) or None
-                result["description"] = details.description[:200] + "..." if details.description and len(details.description) > 200 else details.description
-        except Exception:
-            pass  # Ticker details may not be available on all plans
-
         return result
 
     except Exception as e:
         return {"error": f"Failed to fetch quote for {symbol}: {str(e)}"}
 
 
-def get_option_expirations(symbol: str) -> list[str]:
+@ttl_cache(7 * 24 * 3600)
+def _get_ticker_details(symbol: str) -> Optional[dict]:
+    """Get market cap and a short description for a ticker.
+
+    Company details change rarely, so they are cached for a week.
+    Returns None if details are not available (not on all plans).
+    """
+    try:
+        details = _get_polygon_client().get_ticker_details(symbol)
+    except Exception:
+        return None
+    if not details:
+        return None
+    return {
+        "market_cap": safe_int(details.market_cap, None),
+        "description": details.description[:200] + "..." if details.description and len(details.description) > 200 else details.description,
+    }
+
+
+def get_option_expirations(
+    symbol: str,
+    max_expirations: Optional[int] = None,
+    min_date: Optional[str] = None,
+    max_date: Optional[str] = None,
+) -> list[str]:
     """Get available option expiration dates for a symbol.
 
     Args:
         symbol: Stock ticker symbol
+        max_expirations: Stop after this many (nearest) expirations. Contracts
+                         are listed in expiration order, so this saves paging
+                         through the whole contract list on liquid names.
+        min_date: Earliest expiration to include (YYYY-MM-DD), filtered by Polygon
+        max_date: Latest expiration to include (YYYY-MM-DD), filtered by Polygon
 
     Returns:
-        List of expiration dates in YYYY-MM-DD format
+        List of expiration dates in YYYY-MM-DD format, soonest first
     """
+    # Today's date is part of the cache key, so a list cached yesterday (which
+    # may still hold expirations that have since passed) is never served
+    return list(_get_option_expirations(
+        symbol.upper(), max_expirations, min_date, max_date, date.today().isoformat()
+    ))
+
+
+@ttl_cache(24 * 3600, env_var="EXPIRATIONS_TTL")
+def _get_option_expirations(
+    symbol: str,
+    max_expirations: Optional[int],
+    min_date: Optional[str],
+    max_date: Optional[str],
+    as_of: str,
+) -> list[str]:
+    """Cached body of get_option_expirations(); as_of only keys the cache by day."""
     client = _get_polygon_client()
-    symbol = symbol.upper()
 
     try:
-        # Get options contracts to find available expirations
-        expirations = set()
+        # Get options contracts (soonest expiration first) to find expirations
+        expirations = []
+        seen = set()
         for contract in client.list_options_contracts(
             underlying_ticker=symbol,
             expired=False,
+            expiration_date_gte=min_date,
+            expiration_date_lte=max_date,
+            sort="expiration_date",
+            order="asc",
             limit=1000,
         ):
-            if hasattr(contract, 'expiration_date'):
-                expirations.add(contract.expiration_date)
+            exp = getattr(contract, 'expiration_date', None)
+            if exp and exp not in seen:
+                seen.add(exp)
+                expirations.append(exp)
+                if max_expirations is not None and len(expirations) >= max_expirations:
+                    break
 
-        return sorted(list(expirations))
+        return expirations
     except Exception as e:
         return []
 
 
-def _estimate_delta(current_price: float, strike: float, dte: int, opt_type: str) -> float:
-    """Estimate delta from moneyness (rough approximation).
-
-    Uses a simplified model based on moneyness and time to expiration.
-    For more accurate Greeks, upgrade to Polygon Developer plan.
-    """
-    import math
-
-    moneyness = (current_price - strike) / current_price
-
-    # Adjust for time - options closer to expiry have more extreme deltas
-    time_factor = max(0.1, min(1.0, dte / 30))  # Normalize around 30 DTE
-
-    if opt_type == 'call':
-        # Call delta: 0.5 at ATM, higher for ITM, lower for OTM
-        raw_delta = 0.5 + moneyness * 2 * (1 / time_factor)
-    else:
-        # Put delta: -0.5 at ATM, use absolute value
-        raw_delta = 0.5 - moneyness * 2 * (1 / time_factor)
-
-    return min(0.99, max(0.01, raw_delta))
-
-
 def _get_option_prev_day(client, option_ticker: str) -> Optional[dict]:
     """Get previous day aggregate data for an option contract."""
     try:
@@ -595,6 +785,88 @@ def _get_option_prev_day(client, option_ticker: str) -> Optional[dict]:
     return None
 
 
+def _get_quote_and_expirations(
+    symbol: str,
+    max_expirations: Optional[int] = None,
+    min_dte: Optional[int] = None,
+    max_dte: Optional[int] = None,
+) -> tuple[dict, list[str]]:
+    """Fetch the stock snapshot quote and option expirations concurrently.
+
+    The two lookups are independent, so they share one round-trip of latency.
+    If a DTE window is given, only expirations inside it are listed.
+    """
+    today = date.today()
+    min_date = max_date = None
+    if min_dte is not None:
+        min_date = (today + timedelta(days=min_dte)).isoformat()
+    if max_dte is not None:
+        max_date = (today + timedelta(days=max_dte)).isoformat()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        quote = pool.submit(_get_stock_snapshot, symbol)
+        expirations = pool.submit(
+            get_option_expirations, symbol, max_expirations, min_date, max_date
+        )
+        return quote.result(), expirations.result()
+
+
+@ttl_cache(30, env_var="CHAIN_TTL")
+def _fetch_snapshot_chain(symbol: str, expiration: str, contract_type: str) -> list:
+    """Fetch the option chain snapshot for one expiration and contract type, as a list.
+
+    Shared by get_option_chain() and the covered call / CSP scans, so asking
+    for a chain and then for the best strike reuses one download. Always
+    fetched per contract type ("call" or "put") so every caller hits the
+    same cache keys. Raises on request failure.
+    """
+    client = _get_polygon_client()
+    return list(client.list_snapshot_options_chain(
+        symbol,
+        params={
+            "expiration_date": expiration,
+            "contract_type": contract_type,
+        },
+    ))
+
+
+def _fetch_chain(symbol: str, expiration: str, contract_type: str) -> list:
+    """Fetch the full option chain snapshot for one expiration and contract type.
+
+    Returns an empty list if the request fails, so one bad expiration doesn't
+    sink the whole scan.
+    """
+    try:
+        return _fetch_snapshot_chain(symbol, expiration, contract_type)
+    except Exception:
+        return []
+
+
+def _fetch_chains(
+    symbol: str,
+    expirations: list[tuple[str, int]],
+    contract_type: str,
+) -> list[tuple[str, int, list]]:
+    """Fetch chain snapshots for several expirations concurrently.
+
+    Args:
+        expirations: (expiration, dte) pairs, already filtered to the DTE window
+
+    Returns:
+        (expiration, dte, contracts) triples in the order given
+    """
+    if not expirations:
+        return []
+
+    workers = min(_POLYGON_MAX_CONNECTIONS, len(expirations))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        chains = pool.map(
+            lambda exp: _fetch_chain(symbol, exp[0], contract_type),
+            expirations,
+        )
+        return [(exp, dte, chain) for (exp, dte), chain in zip(expirations, chains)]
+
+
 def get_option_chain(
     symbol: str,
     expiration: Optional[str] = None,
@@ -621,18 +893,15 @@ def get_option_chain(
     Returns:
         Dict with stock price, expirations, and option chains with Greeks
     """
-    client = _get_polygon_client()
     symbol = symbol.upper()
+    option_type = option_type.lower() if option_type else None
 
-    # Get current stock price first
-    quote = get_stock_quote(symbol)
+    # Get current stock price and the next 20 expirations
+    quote, expirations = _get_quote_and_expirations(symbol, max_expirations=20)
     if "error" in quote:
         return quote
     current_price = quote["price"]
 
-    # Get available expirations
-    expirations = get_option_expirations(symbol)
-
     if not expirations:
         return {"error": f"No options available for {symbol}"}
 
@@ -641,82 +910,94 @@ def get_option_chain(
         return {
             "symbol": symbol,
             "price": current_price,
-            "expirations": expirations[:20],  # Limit to next 20 expirations
+            "expirations": expirations,
             "message": "Specify an expiration date to get the option chain"
         }
 
     # Calculate DTE
-    exp_date = datetime.strptime(expiration, "%Y-%m-%d")
-    dte = (exp_date - datetime.now()).days
+    dte = (date.fromisoformat(expiration) - date.today()).days
 
-    # Build params for option chain snapshot
-    params = {"expiration_date": expiration}
-    if option_type:
-        params["contract_type"] = option_type.lower()
+    # Width of the near-the-money band around the current price (2.5% per strike step)
+    ntm_band = near_the_money * (current_price * 0.025) if near_the_money is not None else None
 
-    # Fetch option chain using snapshot API (requires Options Starter+)
-    try:
-        options_data = []
+    # Bind builtins and helpers locally for the per-contract loop
+    _abs, _round, _ga, _sf, _si = abs, round, getattr, safe_float, safe_int
 
-        for opt in client.list_snapshot_options_chain(symbol, params=params):
-            details = opt.details if hasattr(opt, 'details') else None
-            greeks = opt.greeks if hasattr(opt, 'greeks') else None
-            last_quote = opt.last_quote if hasattr(opt, 'last_quote') else None
-            day = opt.day if hasattr(opt, 'day') else None
+    # Fetch option chain using snapshot API (requires Options Starter+), one
+    # request per contract type so the chains are shared with the CC/CSP scans
+    contract_types = (option_type,) if option_type else ("call", "put")
+    calls = []
+    puts = []
+    try:
+        with ThreadPoolExecutor(max_workers=len(contract_types)) as pool:
+            chains = list(pool.map(
+                lambda contract_type: _fetch_snapshot_chain(symbol, expiration, contract_type),
+                contract_types,
+            ))
+
+        for opt in itertools.chain.from_iterable(chains):
+            details = _ga(opt, 'details', None)
+            greeks = _ga(opt, 'greeks', None)
+            last_quote = _ga(opt, 'last_quote', None)
+            last_trade = _ga(opt, 'last_trade', None)
+            day = _ga(opt, 'day', None)
 
             if not details:
                 continue
 
-            strike = safe_float(details.strike_price)
-            opt_type = details.contract_type if hasattr(details, 'contract_type') else 'unknown'
+            strike = _sf(details.strike_price)
+            opt_type = _ga(details, 'contract_type', 'unknown')
 
             # Get delta from greeks (use absolute value)
-            delta = abs(safe_float(greeks.delta if greeks else None))
+            delta = _abs(_sf(greeks.delta if greeks else None))
+            volume = _si(day.volume if day else None)
 
-            # Calculate if ITM
-            itm = (opt_type == 'call' and current_price > strike) or \
-                  (opt_type == 'put' and current_price < strike)
+            # Apply filters before building the option dict
+            if ntm_band is not None and _abs(strike - current_price) > ntm_band:
+                continue
+            if min_delta is not None and delta and delta < min_delta:
+                continue
+            if max_delta is not None and delta and delta > max_delta:
+                continue
+            if min_volume is not None and volume < min_volume:
+                continue
 
-            # Get bid/ask if available (requires Advanced plan)
-            bid = safe_float(last_quote.bid if last_quote else None) or None
-            ask = safe_float(last_quote.ask if last_quote else None) or None
+            is_call = opt_type == 'call'
+            is_put = not is_call and opt_type == 'put'
+
+            # Calculate if ITM
+            itm = (is_call and current_price > strike) or (is_put and current_price < strike)
 
             # Get price - prefer last trade, fall back to day close
-            last_price = safe_float(opt.last_trade.price if hasattr(opt, 'last_trade') and opt.last_trade else None)
+            last_price = _sf(last_trade.price if last_trade else None)
             if not last_price and day:
-                last_price = safe_float(day.close)
+                last_price = _sf(day.close)
 
             # Get IV (convert from decimal to percentage)
-            iv = safe_float(opt.implied_volatility) * 100 if opt.implied_volatility else None
+            iv = _sf(opt.implied_volatility) * 100 if opt.implied_volatility else None
 
             option = {
                 "strike": strike,
                 "type": opt_type,
-                "last": round(last_price, 2) if last_price else None,
-                "bid": round(bid, 2) if bid else None,
-                "ask": round(ask, 2) if ask else None,
-                "volume": safe_int(day.volume if day else None),
-                "open_interest": safe_int(opt.open_interest) or None,
-                "iv": round(iv, 1) if iv else None,
+                "last": _round(last_price, 2) if last_price else None,
+                # Bid/ask only come with the Advanced plan
+                "bid": _round_or_none(last_quote.bid if last_quote else None, 2),
+                "ask": _round_or_none(last_quote.ask if last_quote else None, 2),
+                "volume": volume,
+                "open_interest": _si(opt.open_interest, None),
+                "iv": _round(iv, 1) if iv else None,
                 "itm": itm,
-                "delta": round(delta, 3) if delta else None,
-                "gamma": round(safe_float(greeks.gamma if greeks else None), 4) or None,
-                "theta": round(safe_float(greeks.theta if greeks else None), 4) or None,
-                "vega": round(safe_float(greeks.vega if greeks else None), 4) or None,
+                "delta": _round(delta, 3) if delta else None,
+                "gamma": _round_or_none(greeks.gamma if greeks else None, 4),
+                "theta": _round_or_none(greeks.theta if greeks else None, 4),
+                "vega": _round_or_none(greeks.vega if greeks else None, 4),
             }
 
-            # Apply filters
-            if near_the_money is not None:
-                if abs(strike - current_price) > near_the_money * (current_price * 0.025):
-                    continue
-            if min_delta is not None and delta and delta < min_delta:
-                continue
-            if max_delta is not None and delta and delta > max_delta:
-                continue
-            if min_volume is not None and option["volume"] < min_volume:
-                continue
-
-            options_data.append(option)
+            # Split into calls and puts as we go
+            if is_call:
+                calls.append(option)
+            elif is_put:
+                puts.append(option)
 
     except Exception as e:
         error_msg = str(e)
@@ -731,18 +1012,62 @@ def get_option_chain(
         "dte": dte,
     }
 
-    # Split into calls and puts
-    calls = sorted([o for o in options_data if o["type"] == "call"], key=lambda x: x["strike"])
-    puts = sorted([o for o in options_data if o["type"] == "put"], key=lambda x: x["strike"])
+    calls.sort(key=itemgetter("strike"))
+    puts.sort(key=itemgetter("strike"))
 
-    if option_type is None or option_type.lower() == 'call':
+    if option_type is None or option_type == 'call':
         result["calls"] = calls
-    if option_type is None or option_type.lower() == 'put':
+    if option_type is None or option_type == 'put':
         result["puts"] = puts
 
     return result
 
 
+def _score_premiums(
+    prices: np.ndarray,
+    basis: float | np.ndarray,
+    dtes: np.ndarray,
+    deltas: list,
+    target_delta: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Shared scoring for covered calls and cash-secured puts.
+
+    Returns (premium_pct, annualized_return, delta_diff) arrays. Premium is
+    expressed as a % of basis: the stock price for calls, the strike for puts.
+    """
+    premium_pct = prices / basis * 100
+    # Divide before scaling, as the per-contract formula did, so the rounded
+    # returns (and the ranking ties on them) come out the same
+    annualized_return = np.divide(
+        premium_pct, dtes, out=np.zeros_like(premium_pct), where=dtes > 0
+    ) * 365
+    delta_diff = np.abs(np.asarray(deltas) - target_delta)
+    return premium_pct, annualized_return, delta_diff
+
+
+def _top_candidates(
+    eligible: np.ndarray,
+    delta_diff: np.ndarray,
+    annualized_return: np.ndarray,
+    n: int = 10,
+) -> np.ndarray:
+    """Indices of the n best candidates, in rank order.
+
+    Ranks by closeness to target delta, then by higher annualized return
+    rounded to the reported 0.1%, so contracts that show the same return
+    keep their fetch order. np.partition first narrows the pool to
+    contracts whose delta_diff is within the n smallest (ties included), so
+    only those are fully sorted.
+    """
+    if len(eligible) > n:
+        diffs = delta_diff[eligible]
+        cutoff = np.partition(diffs, n - 1)[n - 1]
+        eligible = eligible[diffs <= cutoff]
+
+    ranked = np.lexsort((-np.round(annualized_return[eligible], 1), delta_diff[eligible]))
+    return eligible[ranked[:n]]
+
+
 def find_covered_call(
     symbol: str,
     shares: int = 100,
@@ -766,107 +1091,120 @@ def find_covered_call(
     Returns:
         Dict with stock info and ranked call candidates
     """
-    client = _get_polygon_client()
     symbol = symbol.upper()
 
-    # Get current stock price
-    quote = get_stock_quote(symbol)
+    # Get current stock price and the expirations in the DTE window
+    quote, expirations = _get_quote_and_expirations(
+        symbol, min_dte=min_dte, max_dte=max_dte
+    )
     if "error" in quote:
         return quote
     current_price = quote["price"]
     position_value = current_price * shares
 
-    # Get available expirations
-    expirations = get_option_expirations(symbol)
     if not expirations:
-        return {"error": f"No options available for {symbol}"}
+        return {"error": f"No options available for {symbol} expiring in {min_dte}-{max_dte} days"}
 
-    candidates = []
-    today = datetime.now()
+    today = date.today()
 
+    # Only fetch expirations inside the DTE window
+    in_window = []
     for exp in expirations:
-        exp_date = datetime.strptime(exp, "%Y-%m-%d")
-        dte = (exp_date - today).days
+        dte = (date.fromisoformat(exp) - today).days
+        if min_dte <= dte <= max_dte:
+            in_window.append((exp, dte))
 
-        if dte < min_dte or dte > max_dte:
-            continue
+    # Per-contract fields, one list per column; scored together below
+    exps, dtes, strikes, deltas, prices, ivs, volumes, ois = ([] for _ in range(8))
 
-        # Get option chain snapshot for this expiration
+    # Bind builtins and helpers locally for the per-contract loop
+    _abs, _ga, _sf, _si = abs, getattr, safe_float, safe_int
+
+    # Fetch the chain snapshots for all expirations in parallel
+    for exp, dte, chain in _fetch_chains(symbol, in_window, "call"):
         try:
-            for opt in client.list_snapshot_options_chain(
-                symbol,
-                params={
-                    "expiration_date": exp,
-                    "contract_type": "call",
-                },
-            ):
-                details = opt.details if hasattr(opt, 'details') else None
-                greeks = opt.greeks if hasattr(opt, 'greeks') else None
+            for opt in chain:
+                details = _ga(opt, 'details', None)
+                greeks = _ga(opt, 'greeks', None)
+                day = _ga(opt, 'day', None)
+                last_trade = _ga(opt, 'last_trade', None)
 
                 if not details:
                     continue
 
-                strike = safe_float(details.strike_price)
+                strike = _sf(details.strike_price)
 
                 # Skip ITM calls for covered call strategy
                 if strike <= current_price:
                     continue
 
                 # Get delta from greeks
-                delta = abs(safe_float(greeks.delta if greeks else None))
+                delta = _abs(_sf(greeks.delta if greeks else None))
                 if delta == 0:
                     continue
 
                 # Get price - prefer last trade, fall back to day close
-                day = opt.day if hasattr(opt, 'day') else None
-                last_price = safe_float(opt.last_trade.price if hasattr(opt, 'last_trade') and opt.last_trade else None)
+                last_price = _sf(last_trade.price if last_trade else None)
                 if not last_price and day:
-                    last_price = safe_float(day.close)
+                    last_price = _sf(day.close)
                 if last_price <= 0:
                     continue
 
                 # Get IV
-                iv = safe_float(opt.implied_volatility) * 100 if opt.implied_volatility else None
-
-                # Calculate metrics
-                num_contracts = shares // 100
-                premium = last_price * 100 * num_contracts
-                premium_pct = (last_price / current_price) * 100
-                annualized_return = (premium_pct / dte) * 365 if dte > 0 else 0
-                upside_to_strike = ((strike - current_price) / current_price) * 100
-                max_return_pct = premium_pct + upside_to_strike
-                breakeven = current_price - last_price
-
-                if premium_pct < min_premium_pct:
-                    continue
-
-                # Score based on closeness to target delta
-                delta_diff = abs(delta - target_delta)
-
-                candidates.append({
-                    "expiration": exp,
-                    "dte": dte,
-                    "strike": strike,
-                    "last": round(last_price, 2),
-                    "volume": safe_int(opt.day.volume if hasattr(opt, 'day') and opt.day else None),
-                    "open_interest": safe_int(opt.open_interest) or None,
-                    "iv": round(iv, 1) if iv else None,
-                    "delta": round(delta, 3),
-                    "contracts": num_contracts,
-                    "premium": round(premium, 2),
-                    "premium_pct": round(premium_pct, 2),
-                    "annualized_return": round(annualized_return, 1),
-                    "upside_to_strike": round(upside_to_strike, 1),
-                    "max_return_pct": round(max_return_pct, 1),
-                    "breakeven": round(breakeven, 2),
-                    "delta_diff": delta_diff,
-                })
+                iv = _sf(opt.implied_volatility) * 100 if opt.implied_volatility else None
+                volume = _si(day.volume if day else None)
+                open_interest = _si(opt.open_interest, None)
+
+                exps.append(exp)
+                dtes.append(dte)
+                strikes.append(strike)
+                deltas.append(delta)
+                prices.append(last_price)
+                ivs.append(iv)
+                volumes.append(volume)
+                ois.append(open_interest)
 
         except Exception:
             continue
 
-    # Sort by closeness to target delta, then by annualized return
-    candidates.sort(key=lambda x: (x['delta_diff'], -x['annualized_return']))
+    candidates = []
+    num_contracts = shares // 100
+
+    if strikes and current_price > 0:
+        # Calculate metrics for all contracts at once
+        strike_arr = np.asarray(strikes)
+        price_arr = np.asarray(prices)
+        dte_arr = np.asarray(dtes, dtype=float)
+
+        premium_pct, annualized_return, delta_diff = _score_premiums(
+            price_arr, current_price, dte_arr, deltas, target_delta
+        )
+        upside_to_strike = (strike_arr - current_price) / current_price * 100
+        max_return_pct = premium_pct + upside_to_strike
+        breakeven = current_price - price_arr
+
+        # Rank by closeness to target delta, then by annualized return
+        eligible = np.flatnonzero(premium_pct >= min_premium_pct)
+
+        for i in _top_candidates(eligible, delta_diff, annualized_return):
+            candidates.append({
+                "expiration": exps[i],
+                "dte": dtes[i],
+                "strike": strikes[i],
+                "last": round(prices[i], 2),
+                "volume": volumes[i],
+                "open_interest": ois[i],
+                "iv": round(ivs[i], 1) if ivs[i] else None,
+                "delta": round(deltas[i], 3),
+                "contracts": num_contracts,
+                "premium": round(prices[i] * 100 * num_contracts, 2),
+                "premium_pct": round(float(premium_pct[i]), 2),
+                "annualized_return": round(float(annualized_return[i]), 1),
+                "upside_to_strike": round(float(upside_to_strike[i]), 1),
+                "max_return_pct": round(float(max_return_pct[i]), 1),
+                "breakeven": round(float(breakeven[i]), 2),
+                "delta_diff": float(delta_diff[i]),
+            })
 
     return {
         "symbol": symbol,
@@ -874,7 +1212,7 @@ def find_covered_call(
         "shares": shares,
         "position_value": round(position_value, 2),
         "target_delta": target_delta,
-        "candidates": candidates[:10],
+        "candidates": candidates,
     }
 
 
@@ -901,46 +1239,49 @@ def find_cash_secured_put(
     Returns:
         Dict with stock info and ranked put candidates
     """
-    client = _get_polygon_client()
     symbol = symbol.upper()
 
-    # Get current stock price
-    quote = get_stock_quote(symbol)
+    # Get current stock price and the expirations in the DTE window
+    quote, expirations = _get_quote_and_expirations(
+        symbol, min_dte=min_dte, max_dte=max_dte
+    )
     if "error" in quote:
         return quote
     current_price = quote["price"]
 
-    # Get available expirations
-    expirations = get_option_expirations(symbol)
     if not expirations:
-        return {"error": f"No options available for {symbol}"}
+        return {"error": f"No options available for {symbol} expiring in {min_dte}-{max_dte} days"}
 
-    candidates = []
-    today = datetime.now()
+    today = date.today()
 
+    # Only fetch expirations inside the DTE window
+    in_window = []
     for exp in expirations:
-        exp_date = datetime.strptime(exp, "%Y-%m-%d")
-        dte = (exp_date - today).days
+        dte = (date.fromisoformat(exp) - today).days
+        if min_dte <= dte <= max_dte:
+            in_window.append((exp, dte))
 
-        if dte < min_dte or dte > max_dte:
-            continue
+    # Per-contract fields, one list per column; scored together below
+    exps, dtes, strikes, deltas, prices, ivs, volumes, ois, contracts = (
+        [] for _ in range(9)
+    )
+
+    # Bind builtins and helpers locally for the per-contract loop
+    _abs, _ga, _sf, _si = abs, getattr, safe_float, safe_int
 
-        # Get option chain snapshot for this expiration
+    # Fetch the chain snapshots for all expirations in parallel
+    for exp, dte, chain in _fetch_chains(symbol, in_window, "put"):
         try:
-            for opt in client.list_snapshot_options_chain(
-                symbol,
-                params={
-                    "expiration_date": exp,
-                    "contract_type": "put",
-                },
-            ):
-                details = opt.details if hasattr(opt, 'details') else None
-                greeks = opt.greeks if hasattr(opt, 'greeks') else None
+            for opt in chain:
+                details = _ga(opt, 'details', None)
+                greeks = _ga(opt, 'greeks', None)
+                day = _ga(opt, 'day', None)
+                last_trade = _ga(opt, 'last_trade', None)
 
                 if not details:
                     continue
 
-                strike = safe_float(details.strike_price)
+                strike = _sf(details.strike_price)
 
                 # Skip ITM puts for CSP strategy
                 if strike >= current_price:
@@ -952,71 +1293,84 @@ def find_cash_secured_put(
                     continue
 
                 # Get delta from greeks (use absolute value for puts)
-                delta = abs(safe_float(greeks.delta if greeks else None))
+                delta = _abs(_sf(greeks.delta if greeks else None))
                 if delta == 0:
                     continue
 
                 # Get price - prefer last trade, fall back to day close
-                day = opt.day if hasattr(opt, 'day') else None
-                last_price = safe_float(opt.last_trade.price if hasattr(opt, 'last_trade') and opt.last_trade else None)
+                last_price = _sf(last_trade.price if last_trade else None)
                 if not last_price and day:
-                    last_price = safe_float(day.close)
+                    last_price = _sf(day.close)
                 if last_price <= 0:
                     continue
 
                 # Get IV
-                iv = safe_float(opt.implied_volatility) * 100 if opt.implied_volatility else None
+                iv = _sf(opt.implied_volatility) * 100 if opt.implied_volatility else None
+                volume = _si(day.volume if day else None)
+                open_interest = _si(opt.open_interest, None)
 
-                # Calculate metrics
                 num_contracts = int(cash_available // collateral)
                 if num_contracts < 1:
                     continue
 
-                premium = last_price * 100 * num_contracts
-                premium_pct = (last_price / strike) * 100
-                annualized_return = (premium_pct / dte) * 365 if dte > 0 else 0
-                discount_to_current = ((current_price - strike) / current_price) * 100
-                breakeven = strike - last_price
-                cost_basis_if_assigned = breakeven
-
-                if premium_pct < min_premium_pct:
-                    continue
-
-                # Score based on closeness to target delta
-                delta_diff = abs(delta - target_delta)
-
-                candidates.append({
-                    "expiration": exp,
-                    "dte": dte,
-                    "strike": strike,
-                    "last": round(last_price, 2),
-                    "volume": safe_int(opt.day.volume if hasattr(opt, 'day') and opt.day else None),
-                    "open_interest": safe_int(opt.open_interest) or None,
-                    "iv": round(iv, 1) if iv else None,
-                    "delta": round(delta, 3),
-                    "contracts": num_contracts,
-                    "collateral": round(collateral * num_contracts, 2),
-                    "premium": round(premium, 2),
-                    "premium_pct": round(premium_pct, 2),
-                    "annualized_return": round(annualized_return, 1),
-                    "discount_to_current": round(discount_to_current, 1),
-                    "breakeven": round(breakeven, 2),
-                    "cost_basis_if_assigned": round(cost_basis_if_assigned, 2),
-                    "delta_diff": delta_diff,
-                })
+                exps.append(exp)
+                dtes.append(dte)
+                strikes.append(strike)
+                deltas.append(delta)
+                prices.append(last_price)
+                ivs.append(iv)
+                volumes.append(volume)
+                ois.append(open_interest)
+                contracts.append(num_contracts)
 
         except Exception:
             continue
 
-    # Sort by closeness to target delta, then by annualized return
-    candidates.sort(key=lambda x: (x['delta_diff'], -x['annualized_return']))
+    candidates = []
+
+    if strikes:
+        # Calculate metrics for all contracts at once
+        strike_arr = np.asarray(strikes)
+        price_arr = np.asarray(prices)
+        dte_arr = np.asarray(dtes, dtype=float)
+
+        premium_pct, annualized_return, delta_diff = _score_premiums(
+            price_arr, strike_arr, dte_arr, deltas, target_delta
+        )
+        discount_to_current = (current_price - strike_arr) / current_price * 100
+        breakeven = strike_arr - price_arr
+
+        # Rank by closeness to target delta, then by annualized return
+        eligible = np.flatnonzero(premium_pct >= min_premium_pct)
+
+        for i in _top_candidates(eligible, delta_diff, annualized_return):
+            num_contracts = contracts[i]
+            candidates.append({
+                "expiration": exps[i],
+                "dte": dtes[i],
+                "strike": strikes[i],
+                "last": round(prices[i], 2),
+                "volume": volumes[i],
+                "open_interest": ois[i],
+                "iv": round(ivs[i], 1) if ivs[i] else None,
+                "delta": round(deltas[i], 3),
+                "contracts": num_contracts,
+                "collateral": round(strikes[i] * 100 * num_contracts, 2),
+                "premium": round(prices[i] * 100 * num_contracts, 2),
+                "premium_pct": round(float(premium_pct[i]), 2),
+                "annualized_return": round(float(annualized_return[i]), 1),
+                "discount_to_current": round(float(discount_to_current[i]), 1),
+                "breakeven": round(float(breakeven[i]), 2),
+                "cost_basis_if_assigned": round(float(breakeven[i]), 2),
+                "delta_diff": float(delta_diff[i]),
+            })
 
     return {
         "symbol": symbol,
         "price": round(current_price, 2),
         "cash_available": round(cash_available, 2),
         "target_delta": target_delta,
-        "candidates": candidates[:10],
+        "candidates": candidates,
     }
 
 
@@ -1025,7 +1379,7 @@ def find_cash_secured_put(
 # =============================================================================
 
 
-def analyze_position_cost_basis(csv_content: str, symbol: str) -> dict:
+def analyze_position_cost_basis(csv_content: str | bytes, symbol: str) -> dict:
     """Analyze true cost basis for a position from Schwab transaction history.
 
     Parses a Schwab transaction CSV export and calculates the premium-adjusted
@@ -1033,7 +1387,8 @@ def analyze_position_cost_basis(csv_content: str, symbol: str) -> dict:
     the share acquisition cost (Buy/Assigned).
 
     Args:
-        csv_content: Raw CSV content from Schwab transaction export
+        csv_content: Raw CSV content (string or UTF-8 bytes) from Schwab
+                     transaction export
         symbol: Stock ticker to analyze (e.g., 'SOFI')
 
     Returns:
@@ -1043,7 +1398,7 @@ def analyze_position_cost_basis(csv_content: str, symbol: str) -> dict:
     symbol = symbol.upper()
 
     # Parse CSV - Schwab CSVs have quoted fields
-    df = pd.read_csv(io.StringIO(csv_content))
+    df = pd.read_csv(_csv_buffer(csv_content))
     df.columns = df.columns.str.strip().str.strip('"')
 
     # Clean Amount column - remove $, commas, quotes, convert to float
@@ -1178,7 +1533,7 @@ def analyze_position_cost_basis(csv_content: str, symbol: str) -> dict:
 
     # Get current price for ROAS
     try:
-        quote = get_stock_quote(symbol)
+        quote = _get_stock_snapshot(symbol)
         current_price = quote.get("price", 0)
     except Exception:
         current_price = 0
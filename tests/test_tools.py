@@ -0,0 +1,113 @@
+"""Tests for portfolio_mcp.tools."""
+
+import numpy as np
+import pytest
+
+from portfolio_mcp import tools
+
+
+@pytest.fixture
+def polygon_client(monkeypatch):
+    monkeypatch.setenv("POLYGON_API_KEY", "test-key")
+    monkeypatch.setenv("POLYGON_REQUEST_TIMEOUT", "7")
+    tools._get_polygon_client.cache_clear()
+    yield tools._get_polygon_client()
+    tools._get_polygon_client.cache_clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() for ttl_cache, with an empty cache."""
+    now = [1000.0]
+    monkeypatch.setattr(tools.time, "monotonic", lambda: now[0])
+    tools._CACHE.clear()
+    yield now
+    tools._CACHE.clear()
+
+
+def test_polygon_client_applies_request_timeout(polygon_client):
+    pool = polygon_client.client.connection_from_host("api.polygon.io", scheme="https")
+    assert pool.timeout.connect_timeout == 7
+    assert pool.timeout.read_timeout == 7
+
+
+def test_ttl_cache_reuses_results_until_expiry(clock):
+    calls = []
+
+    @tools.ttl_cache(60)
+    def lookup(symbol):
+        calls.append(symbol)
+        return {"symbol": symbol}
+
+    assert lookup("NVDA") == {"symbol": "NVDA"}
+    assert lookup("NVDA") == {"symbol": "NVDA"}
+    assert calls == ["NVDA"]
+
+    clock[0] += 61
+    lookup("NVDA")
+    assert calls == ["NVDA", "NVDA"]
+
+
+@pytest.mark.parametrize("result", [{"error": "No data found"}, [], {}, None])
+def test_ttl_cache_skips_errors_and_empty_results(clock, result):
+    calls = []
+
+    @tools.ttl_cache(60)
+    def lookup(symbol):
+        calls.append(symbol)
+        return result
+
+    lookup("NVDA")
+    lookup("NVDA")
+    assert len(calls) == 2
+    assert not tools._CACHE
+
+
+def test_ttl_cache_prunes_expired_entries_on_insert(clock):
+    @tools.ttl_cache(10)
+    def short(key):
+        return [key]
+
+    @tools.ttl_cache(3600)
+    def long(key):
+        return [key]
+
+    short("a")
+    long("b")
+    clock[0] += 11
+    long("c")
+
+    assert [key[1] for key in tools._CACHE] == [("b",), ("c",)]
+
+
+def test_ttl_cache_evicts_least_recently_used_at_maxsize(clock, monkeypatch):
+    monkeypatch.setattr(tools, "_CACHE_MAXSIZE", 3)
+
+    @tools.ttl_cache(60)
+    def lookup(key):
+        return [key]
+
+    for key in "abc":
+        lookup(key)
+    lookup("a")  # a is now the most recently used
+    lookup("d")
+
+    assert len(tools._CACHE) == 3
+    assert [key[1] for key in tools._CACHE] == [("c",), ("a",), ("d",)]
+
+
+def test_top_candidates_matches_full_sort_with_ties_at_cutoff():
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        size = int(rng.integers(1, 40))
+        # Few distinct values, so ties straddle the 10th place on both keys
+        delta_diff = rng.choice([0.01, 0.02, 0.05, 0.1], size)
+        annualized_return = rng.choice([11.96, 12.04, 12.06, 13.0], size)
+        eligible = np.flatnonzero(rng.random(size) < 0.8)
+
+        expected = eligible[np.lexsort((
+            -np.round(annualized_return[eligible], 1),
+            delta_diff[eligible],
+        ))][:10]
+        got = tools._top_candidates(eligible, delta_diff, annualized_return)
+        np.testing.assert_array_equal(got, expected)